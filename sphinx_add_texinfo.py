@@ -45,37 +45,67 @@ THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import ast
+import io
 import os
 import re
+import runpy
+import shutil
+import tempfile
+import tokenize
 
 
-def one_of(candidates, predicate):
-    for doc in candidates:
-        if predicate(doc):
-            return doc
+_RE_UNDERBUILD = re.compile(r'\b_build\b')
+_RE_BUILD = re.compile(r'\bbuild\b')
+
+
+def scan_dir(path):
+    """
+    Map names of the entries in `path` to `os.DirEntry` objects.
+
+    `os.DirEntry.is_dir` and `os.DirEntry.is_file` usually answer
+    without another stat call, so probing the result is cheap.
+
+    :rtype: dict
+
+    """
+    with os.scandir(path) as it:
+        return dict((e.name, e) for e in it)
+
+
+def has_dir(entries, name):
+    entry = entries.get(name)
+    return entry is not None and entry.is_dir()
 
 
-def filter_dict(pred, d):
-    if pred is None:
-        pred = lambda k, v: v is not None
-    return dict((k, v) for (k, v) in d.items() if pred(k, v))
+def has_file(entries, name):
+    entry = entries.get(name)
+    return entry is not None and entry.is_file()
 
 
 def find_sphinx_dir():
-    return one_of(['doc', 'docs'], os.path.isdir)
+    entries = scan_dir('.')
+    for doc in ['doc', 'docs']:
+        if has_dir(entries, doc):
+            return doc
 
 
-def find_sphinx_makefile(doc):
-    return one_of(
-        [os.path.join(doc, 'Makefile')],
-        os.path.isfile)
+def find_sphinx_makefile(doc, entries=None):
+    if entries is None:
+        entries = scan_dir(doc)
+    if has_file(entries, 'Makefile'):
+        return os.path.join(doc, 'Makefile')
 
 
-def find_sphinx_conf(doc):
-    return one_of(
-        [os.path.join(doc, 'conf.py'),
-         os.path.join(doc, 'source', 'conf.py')],
-        os.path.isfile)
+def find_sphinx_conf(doc, entries=None):
+    if entries is None:
+        entries = scan_dir(doc)
+    if has_file(entries, 'conf.py'):
+        return os.path.join(doc, 'conf.py')
+    if has_dir(entries, 'source'):
+        path = os.path.join(doc, 'source', 'conf.py')
+        if os.path.isfile(path):
+            return path
 
 
 MAKEFILE_HELP_LINES = """\
@@ -100,41 +130,54 @@ info:
 \t@echo "makeinfo finished; the Info files are in {builddir}/texinfo."
 """
 
+_MAKEFILE_TARGETS_DEFAULT = MAKEFILE_TARGETS_TEMPLATE.format(
+    builddir='$(BUILDDIR)')
+
 
 def modify_makefile_lines(lines, builddir):
     n_help_lines = 0
     for l in lines:
         yield l
-        if all(w in l for w in ['@echo', 'latex', 'to make LaTeX files,']):
+        if 'to make LaTeX files,' in l and '@echo' in l and 'latex' in l:
             n_help_lines += 1
             yield MAKEFILE_HELP_LINES
-    yield MAKEFILE_TARGETS_TEMPLATE.format(builddir=builddir)
+    if builddir == '$(BUILDDIR)':
+        yield _MAKEFILE_TARGETS_DEFAULT
+    else:
+        yield MAKEFILE_TARGETS_TEMPLATE.format(builddir=builddir)
     assert n_help_lines == 1
 
 
-def get_makefile_builddir(path, lines):
+def get_makefile_builddir(path, lines, entries=None):
     """
     Read Makefile and find appropriate build directory.
 
+    `entries` is the result of `scan_dir` for the directory of `path`.
+    It is only used when `lines` do not tell the build directory.
+
     :rtype: str
     :return: '$(BUILDDIR)', '_build' or 'build'
 
     """
+    found = None
     for l in lines:
         if '$(BUILDDIR)' in l:
             return '$(BUILDDIR)'
-    for l in lines:
-        if re.search(r'\b_build\b', l):
-            return '_build'
-        if re.search(r'\bbuild\b', l):
-            return 'build'
-
-    doc = os.path.dirname(path)
-    build_path = one_of(
-        [os.path.join(doc, 'build'),
-         os.path.join(doc, '_build')],
-        os.path.isdir)
-    return os.path.relpath(build_path, doc)
+        if found or 'build' not in l:
+            continue
+        if _RE_UNDERBUILD.search(l):
+            found = '_build'
+        elif _RE_BUILD.search(l):
+            found = 'build'
+    if found:
+        return found
+
+    if entries is None:
+        entries = scan_dir(os.path.dirname(path) or '.')
+    for build in ['build', '_build']:
+        if has_dir(entries, build):
+            return build
+    raise ValueError('No build directory found for {0}'.format(path))
 
 
 CONF_PY_TEXINFO_DOCUMENTS_TEMPLATE = """
@@ -160,13 +203,13 @@ def conf_py_texinfo_documents(
 
     """
     targetname = targetname or project_name.lower()
-    title = title or '{0} Documentation'.format(project_name)
+    title = title or f'{project_name} Documentation'
     description = description or title
     dir_entry = dir_entry or project_name
     if authors:
         author = '@*'.join(authors)
     else:
-        author = '{0} Development Team'.format(project_name)
+        author = f'{project_name} Development Team'
     return CONF_PY_TEXINFO_DOCUMENTS_TEMPLATE.format(
         startdocname=startdocname,
         targetname=targetname,
@@ -178,10 +221,98 @@ def conf_py_texinfo_documents(
         toctree_only=int(toctree_only))
 
 
-def read_sphinx_conf(confpath):
-    ns = {'__file__': confpath}
-    execfile(confpath, ns)
-    return ns
+def write_temp_file(path, lines):
+    """
+    Write `lines` to a new temporary file next to `path`.
+
+    `lines` may be any iterable, so it is consumed while writing.
+    The temporary file is removed if writing fails.  Move it over
+    `path` with `replace_file` once `path` is no longer open.
+
+    :rtype: str
+    :return: path of the temporary file
+
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.realpath(path)))
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            fp.writelines(lines)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def replace_file(tmp_path, path):
+    """
+    Move `tmp_path` made by `write_temp_file` over `path`.
+
+    Symbolic links are resolved, so the file they point to is replaced
+    and the link itself is kept.  The permission bits of the original
+    file are preserved, but its owner and group are not, and hard links
+    to it keep pointing at the old content.
+
+    """
+    path = os.path.realpath(path)
+    try:
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+SPHINX_CONF_NAMES = ('project', 'master_doc', 'latex_documents')
+
+
+def read_sphinx_conf(confpath, source=None):
+    """
+    Read variables used by `params_for_texinfo_documents` from conf.py.
+
+    Top-level literal assignments to `SPHINX_CONF_NAMES` are extracted
+    without executing conf.py.  It is executed instead only when a
+    needed value cannot be extracted this way: `project` always, and
+    `latex_documents` when `master_doc` is not set.
+    `source` is the content of conf.py, if it is already read.
+
+    :rtype: dict
+
+    """
+    if source is None:
+        with open(confpath, 'rb') as fp:
+            source = fp.read()
+    tree = ast.parse(source, confpath)
+    conf = {}
+    failed = set()
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and \
+               target.id in SPHINX_CONF_NAMES:
+                try:
+                    conf[target.id] = ast.literal_eval(node.value)
+                    failed.discard(target.id)
+                except (ValueError, TypeError):
+                    conf.pop(target.id, None)
+                    failed.add(target.id)
+    if 'project' not in conf or 'master_doc' in failed or \
+       ('master_doc' not in conf and 'latex_documents' not in conf):
+        return runpy.run_path(confpath)
+    return conf
+
+
+def source_encoding(source):
+    """
+    Return the encoding to use when appending to Python `source` bytes.
+
+    :rtype: str
+
+    """
+    encoding = tokenize.detect_encoding(io.BytesIO(source).readline)[0]
+    # Appending must not write another BOM.
+    return 'utf-8' if encoding == 'utf-8-sig' else encoding
 
 
 def params_for_texinfo_documents(conf):
@@ -209,33 +340,38 @@ def params_for_texinfo_documents(conf):
     return params
 
 
-def sphinx_add_texinfo(doc_path, **additional_params):
+def sphinx_add_texinfo(doc_path=None, **additional_params):
     if doc_path is None:
         doc_path = find_sphinx_dir()
 
-    makefile_path = find_sphinx_makefile(doc_path)
-    with open(makefile_path) as fp:
-        makefile_orig_lines = fp.readlines()
-    builddir = get_makefile_builddir(makefile_path, makefile_orig_lines)
-    makefile_lines = list(modify_makefile_lines(makefile_orig_lines, builddir))
+    entries = scan_dir(doc_path)
+    makefile_path = find_sphinx_makefile(doc_path, entries)
+    conf_path = find_sphinx_conf(doc_path, entries)
+    with open(conf_path, 'rb+') as conf_fp:
+        conf_source = conf_fp.read()
+        conf = read_sphinx_conf(conf_path, conf_source)
+        params = params_for_texinfo_documents(conf)
+        params.update(additional_params)
+        conf_addition = conf_py_texinfo_documents(**params).replace(
+            '\n', os.linesep).encode(source_encoding(conf_source))
 
-    conf_path = find_sphinx_conf(doc_path)
-    conf = read_sphinx_conf(conf_path)
-    params = params_for_texinfo_documents(conf)
-    params.update(filter_dict(None, additional_params))
-    conf_addition = conf_py_texinfo_documents(**params)
+        with open(makefile_path) as fp:
+            builddir = get_makefile_builddir(makefile_path, fp, entries)
+            fp.seek(0)
+            tmp_path = write_temp_file(
+                makefile_path, modify_makefile_lines(fp, builddir))
 
-    with open(makefile_path, 'w') as fp:
-        fp.writelines(makefile_lines)
-    with open(conf_path, 'a') as fp:
-        fp.write(conf_addition)
+        replace_file(tmp_path, makefile_path)
+        conf_fp.seek(0, os.SEEK_END)
+        conf_fp.write(conf_addition)
 
 
 def main(args=None):
     import argparse
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        description=__doc__)
+        description=__doc__,
+        argument_default=argparse.SUPPRESS)
     parser.add_argument(
         '--doc-path', '-d',
         help="""